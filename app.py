@@ -1,11 +1,17 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, send_from_directory, abort
 from flask_cors import CORS
 import os
+from profiling_utils import (
+    profiled, tag_intent, is_valid_token, list_profiles, PROFILE_HEADER, PROFILE_OUTPUT_DIR
+)
+from traffic_capture import captured
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS to allow frontend requests from Vercel
 
 @app.route('/api/chat', methods=['POST'])
+@profiled("api_chat", get_headers=lambda: request.headers)
+@captured("api_chat", get_body=lambda: request.get_json(silent=True))
 def chat():
     try:
         data = request.get_json()
@@ -101,10 +107,24 @@ def chat():
                 ]
             }
 
+        tag_intent(response["stage"])
         return jsonify(response), 200
     except Exception as e:
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
+# Debug endpoints for per-request profiles, only reachable with the profiling token
+@app.route('/api/debug/profiles', methods=['GET'])
+def profiles():
+    if not is_valid_token(request.headers.get(PROFILE_HEADER)):
+        abort(404)
+    return jsonify({"profiles": list_profiles()}), 200
+
+@app.route('/api/debug/profiles/<path:filename>', methods=['GET'])
+def profile_file(filename):
+    if not is_valid_token(request.headers.get(PROFILE_HEADER)):
+        abort(404)
+    return send_from_directory(os.path.abspath(PROFILE_OUTPUT_DIR), filename, as_attachment=True)
+
 # Health check endpoint
 @app.route('/health', methods=['GET'])
 def health():
@@ -0,0 +1,234 @@
+"""
+Micro-benchmarks for the agent's pure-Python hot paths.
+
+Usage:
+    python benchmarks.py --save-baseline
+    python benchmarks.py
+    python benchmarks.py --only catalog --threshold 1.5
+
+Each benchmark reports the best per-call time over several timing runs. When a
+baseline exists, the run fails if any benchmark is slower than the baseline
+by more than the threshold factor. Baselines are machine specific, save them
+on the machine that runs the comparison.
+"""
+import os
+import sys
+import json
+import timeit
+import argparse
+
+# Benchmarks never call the real LLM, profile, capture or prefetch
+os.environ.pop("OPENAI_API_KEY", None)
+os.environ["PROFILE_TOKEN"] = ""
+os.environ["PROFILE_SAMPLE_RATE"] = "0"
+os.environ["CAPTURE_TRAFFIC"] = ""
+os.environ["PREFETCH_ENABLED"] = ""
+
+import image_utils
+from image_utils import get_images_by_category, build_catalog, CatalogCache
+from sayyes_agent import (
+    detect_intent, extract_style, extract_location, get_options_based_on_state, generate_fallback_response
+)
+
+BENCHMARK_BASELINE_PATH = os.environ.get('BENCHMARK_BASELINE_PATH', 'benchmark_baseline.json')
+BENCHMARK_THRESHOLD = float(os.environ.get('BENCHMARK_THRESHOLD', '1.25'))
+
+CATALOG_SIZES = (10, 100, 1000, 10000, 100000)
+
+MESSAGES = [
+    "Show me venues",
+    "Can you show me rustic venues in austin?",
+    "I want a modern wedding dress",
+    "Any boho hairstyles for long hair?",
+    "Help with wedding party",
+    "What about wedding cakes",
+    "hello there",
+    "We have a small budget, what do you suggest for the date?",
+]
+
+STATES = [
+    {},
+    {"seen_venues": True},
+    {"seen_venues": True, "seen_dresses": True, "soft_cta_shown": True},
+    {"seen_venues": True, "seen_dresses": True, "seen_hairstyles": True, "soft_cta_shown": True},
+]
+
+STYLES = ["Rustic", "Modern", "Luxury", "Bohemian", "Classic"]
+LOCATIONS = ["Austin, TX", "Paris, France", "New York, NY", "Montana", "Los Angeles, CA"]
+
+
+def synthetic_items(size):
+    """Build a venue catalog of size items shaped like the real catalog."""
+    return [
+        {
+            "image": f"https://example.com/venues/venue_{i}.png",
+            "title": f"{STYLES[i % 5]} Venue {i}",
+            "description": f"A {STYLES[(i + 1) % 5].lower()} wedding venue number {i}",
+            "location": LOCATIONS[(i // 5) % 5],
+            "price": "$" * (1 + i % 4),
+            "tags": [STYLES[i % 5], STYLES[(i + 2) % 5], "Venue"]
+        }
+        for i in range(size)
+    ]
+
+
+def use_synthetic_catalog(size):
+    """Serve a synthetic catalog of size venues from get_images_by_category."""
+    catalog = build_catalog({"venues": synthetic_items(size)})
+    image_utils.catalog_cache = CatalogCache(loader=lambda project_id: catalog)
+
+
+def bench_intent_extraction():
+    for message in MESSAGES:
+        message_lower = message.lower()
+        for state in STATES:
+            detect_intent(message_lower, state)
+        extract_style(message_lower)
+        extract_location(message_lower)
+
+
+def bench_options():
+    for state in STATES:
+        get_options_based_on_state(state)
+
+
+def bench_fallback_response():
+    for message in MESSAGES:
+        generate_fallback_response(message)
+
+
+def catalog_benchmark(size, style=None, location=None):
+    def setup():
+        use_synthetic_catalog(size)
+        # Build the catalog before timing starts
+        get_images_by_category("venues")
+
+    def run():
+        get_images_by_category("venues", style, location)
+    return setup, run
+
+
+def json_benchmark(size):
+    response = {}
+
+    def setup():
+        # Build the response once so only the encoding is timed
+        use_synthetic_catalog(size)
+        response.update({
+            "text": "Check out these gorgeous venues! Any catching your eye? 👀",
+            "carousel": get_images_by_category("venues")["carousel"],
+            "options": ["Show me dresses", "Show me hairstyles", "Help with wedding party"],
+            "state": {"seen_venues": True}
+        })
+
+    def run():
+        json.dumps(response)
+    return setup, run
+
+
+def benchmarks():
+    """List the benchmarks as (name, setup, run) tuples."""
+    suite = [
+        ("intent_and_style_extraction", None, bench_intent_extraction),
+        ("options_based_on_state", None, bench_options),
+        ("fallback_response", None, bench_fallback_response),
+    ]
+    for size in CATALOG_SIZES:
+        suite.append((f"catalog_{size}",) + catalog_benchmark(size))
+        suite.append((f"catalog_{size}_style",) + catalog_benchmark(size, "rustic"))
+        suite.append((f"catalog_{size}_style_location",) + catalog_benchmark(size, "rustic", "austin"))
+    for size in (5, 100):
+        suite.append((f"carousel_json_{size}",) + json_benchmark(size))
+    return suite
+
+
+def time_call(run, repeat=5, min_time=0.2):
+    """Best time per call in seconds over repeat runs of at least min_time."""
+    timer = timeit.Timer(run)
+    number = 1
+    while timer.timeit(number) < min_time:
+        number *= 2
+        if number > 1 << 20:
+            break
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def run_benchmarks(only=None, repeat=5, min_time=0.2):
+    """Run the benchmarks and return the per-call time in seconds of each."""
+    original_cache = image_utils.catalog_cache
+    results = {}
+    try:
+        for name, setup, run in benchmarks():
+            if only and only not in name:
+                continue
+            if setup:
+                setup()
+            results[name] = time_call(run, repeat, min_time)
+    finally:
+        image_utils.catalog_cache = original_cache
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare results to a baseline.
+
+    Returns:
+        Tuple of (report lines, list of regressed benchmark names)
+    """
+    lines = [f"{'benchmark':40} {'time':>12} {'baseline':>12} {'ratio':>7}"]
+    regressions = []
+    for name, seconds in results.items():
+        base = baseline.get(name)
+        ratio = seconds / base if base else None
+        flag = ""
+        if ratio and ratio > threshold:
+            regressions.append(name)
+            flag = "  REGRESSED"
+        lines.append("{:40} {:>12} {:>12} {:>7}{}".format(
+            name, format_time(seconds), format_time(base) if base else "-",
+            f"{ratio:.2f}" if ratio else "-", flag
+        ))
+    return lines, regressions
+
+
+def format_time(seconds):
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds * 1e6:.2f} us"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the hot path micro-benchmarks.")
+    parser.add_argument("--baseline", default=BENCHMARK_BASELINE_PATH, help="Baseline file")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the baseline")
+    parser.add_argument("--threshold", type=float, default=BENCHMARK_THRESHOLD,
+                        help="Fail when a benchmark is slower than the baseline by this factor")
+    parser.add_argument("--only", help="Only run benchmarks whose name contains this text")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing runs per benchmark")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.only, args.repeat)
+
+    baseline = {}
+    if os.path.isfile(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    lines, regressions = compare(results, baseline, args.threshold)
+    print("\n".join(lines))
+
+    if args.save_baseline:
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    for name in regressions:
+        print(f"FAIL: {name} is more than {args.threshold:.2f}x slower than the baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
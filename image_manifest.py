@@ -0,0 +1,288 @@
+"""
+Build the image manifest used by image_utils.
+
+Usage:
+    python image_manifest.py
+    python image_manifest.py --output image_manifest.json --concurrency 32
+    python image_manifest.py --url-file urls.txt --base-url http://127.0.0.1:8000
+
+Every image URL of the catalogs (all tenants) and the fallback images is
+probed concurrently over a pooled HTTP session. The manifest records status,
+byte size, dimensions, a tiny placeholder and srcset width variants for each
+URL. get_images_by_category drops items whose image is broken (404/410 or
+not an image); items whose probe failed transiently are kept as they are.
+"""
+import os
+import io
+import sys
+import json
+import time
+import base64
+import struct
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode, quote
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import image_utils
+
+from PIL import Image
+
+# Widths offered in srcset, never larger than the probed image
+IMAGE_VARIANT_WIDTHS = [int(w) for w in os.environ.get('IMAGE_VARIANT_WIDTHS', '320,640,960,1280').split(',') if w]
+
+# URL template for resizing images that have no resize parameters of their own,
+# e.g. https://example.com/_vercel/image?url={url}&w={width}&q=75
+IMAGE_VARIANT_TEMPLATE = os.environ.get('IMAGE_VARIANT_TEMPLATE', '')
+
+# Hosts that resize through a w= query parameter
+RESIZABLE_HOSTS = ("images.unsplash.com",)
+
+PROBE_TIMEOUT = 15
+MAX_IMAGE_BYTES = 25 * 1024 * 1024
+PLACEHOLDER_WIDTH = 8
+
+# Statuses meaning the image is gone, any other failure may be transient
+BROKEN_STATUSES = (404, 410)
+
+
+def image_dimensions(data):
+    """
+    Read the dimensions of a PNG, GIF, JPEG or WebP image from its header.
+
+    Returns:
+        Tuple of (width, height), or (None, None) for unknown formats
+    """
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        return struct.unpack(">II", data[16:24])
+    if data[:6] in (b"GIF87a", b"GIF89a") and len(data) >= 10:
+        return struct.unpack("<HH", data[6:10])
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP" and len(data) >= 30:
+        chunk = data[12:16]
+        if chunk == b"VP8 ":
+            width, height = struct.unpack("<HH", data[26:30])
+            return width & 0x3FFF, height & 0x3FFF
+        if chunk == b"VP8L":
+            bits = int.from_bytes(data[21:25], "little")
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b"VP8X":
+            return int.from_bytes(data[24:27], "little") + 1, int.from_bytes(data[27:30], "little") + 1
+    if data[:2] == b"\xff\xd8":
+        i = 2
+        while i + 9 < len(data):
+            if data[i] != 0xFF:
+                i += 1
+                continue
+            marker = data[i + 1]
+            # Start of frame markers, excluding DHT, JPG and DAC
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                height, width = struct.unpack(">HH", data[i + 5:i + 9])
+                return width, height
+            if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+                i += 2
+                continue
+            i += 2 + struct.unpack(">H", data[i + 2:i + 4])[0]
+    return None, None
+
+
+def image_placeholder(data):
+    """
+    Build a tiny blurred-image placeholder and the average color of an image.
+
+    Returns:
+        Tuple of (PNG data URI, hex color), or (None, None) if the image cannot be decoded
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image = image.convert("RGB")
+            height = max(1, round(image.height * PLACEHOLDER_WIDTH / image.width))
+            thumbnail = image.resize((PLACEHOLDER_WIDTH, height))
+            red, green, blue = thumbnail.resize((1, 1)).getpixel((0, 0))
+            buffer = io.BytesIO()
+            thumbnail.save(buffer, format="PNG", optimize=True)
+        uri = "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+        return uri, f"#{red:02x}{green:02x}{blue:02x}"
+    except Exception as e:
+        print(f"Error building placeholder: {e}")
+        return None, None
+
+
+def variant_url(url, width):
+    """Get the URL of an image resized to width, or None if it cannot be resized."""
+    parts = urlsplit(url)
+    if parts.hostname in RESIZABLE_HOSTS:
+        query = dict(parse_qsl(parts.query))
+        query["w"] = str(width)
+        return urlunsplit(parts._replace(query=urlencode(query)))
+    if IMAGE_VARIANT_TEMPLATE:
+        return IMAGE_VARIANT_TEMPLATE.format(url=quote(url, safe=""), width=width)
+    return None
+
+
+def image_variants(url, width):
+    """List the srcset variants of an image that is width pixels wide."""
+    if not width:
+        return []
+    variants = []
+    for variant_width in sorted(IMAGE_VARIANT_WIDTHS):
+        if variant_width >= width:
+            break
+        resized = variant_url(url, variant_width)
+        if resized:
+            variants.append({"url": resized, "width": variant_width})
+    if variants:
+        variants.append({"url": url, "width": width})
+    return variants
+
+
+def make_session(pool_size):
+    """Create an HTTP session whose connection pool fits pool_size workers."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def rebase_url(url, base_url):
+    """Move url onto base_url, keeping its path and query (e.g. for a local stand-in server)."""
+    if not base_url:
+        return url
+    parts = urlsplit(url)
+    base = urlsplit(base_url)
+    return urlunsplit(parts._replace(scheme=base.scheme, netloc=base.netloc,
+                                     path=base.path.rstrip("/") + parts.path))
+
+
+def probe_image(session, url, base_url=None):
+    """
+    Download an image and describe it for the manifest.
+
+    Args:
+        session: Pooled HTTP session
+        url: Image URL, used as the manifest key and for srcset variants
+        base_url: Optional server the image is downloaded from instead of url's host
+
+    Returns:
+        Manifest entry for the URL
+    """
+    entry = {"ok": False, "broken": False, "status": None, "bytes": None}
+    try:
+        with session.get(rebase_url(url, base_url), timeout=PROBE_TIMEOUT, stream=True) as response:
+            entry["status"] = response.status_code
+            entry["content_type"] = response.headers.get("Content-Type", "")
+            if response.status_code != 200:
+                entry["broken"] = response.status_code in BROKEN_STATUSES
+                return entry
+            data = bytearray()
+            for chunk in response.iter_content(64 * 1024):
+                data += chunk
+                if len(data) > MAX_IMAGE_BYTES:
+                    entry["error"] = "image too large"
+                    return entry
+            data = bytes(data)
+    except requests.RequestException as e:
+        entry["error"] = str(e)
+        return entry
+
+    width, height = image_dimensions(data)
+    entry["bytes"] = len(data)
+    entry["width"] = width
+    entry["height"] = height
+    if not width:
+        entry["error"] = "not a recognized image"
+        entry["broken"] = True
+        return entry
+
+    entry["ok"] = True
+    entry["placeholder"], entry["color"] = image_placeholder(data)
+    entry["variants"] = image_variants(url, width)
+    if entry["variants"]:
+        entry["srcset"] = ", ".join(f"{v['url']} {v['width']}w" for v in entry["variants"])
+    return entry
+
+
+def probe_images(urls, concurrency=16, session=None, base_url=None):
+    """
+    Probe image URLs concurrently over one pooled session.
+
+    Returns:
+        Dictionary mapping each URL to its manifest entry
+    """
+    session = session or make_session(concurrency)
+    urls = list(dict.fromkeys(urls))
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        entries = executor.map(lambda url: probe_image(session, url, base_url), urls)
+        return dict(zip(urls, entries))
+
+
+def catalog_image_urls():
+    """Collect the image URLs of every tenant's catalog and the fallback images."""
+    urls = []
+    projects = [image_utils.VERCEL_PROJECT_ID] + list(image_utils.TENANT_PROJECTS.values())
+    for project_id in dict.fromkeys(projects):
+        for items in image_utils.load_catalog_items(project_id).values():
+            urls.extend(item.get("image") or item.get("share_url", "") for item in items)
+    for category in image_utils.CATEGORIES + ("other",):
+        urls.extend(item["image"] for item in image_utils.get_fallback_images(category))
+    return [url for url in urls if url]
+
+
+def read_url_file(path):
+    """Read image URLs from a file, one per line, ignoring blank lines and # comments."""
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+
+def build_manifest(urls, concurrency=16, session=None, base_url=None):
+    """Probe urls and build the manifest document."""
+    return {
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "images": probe_images(urls, concurrency, session, base_url)
+    }
+
+
+def missing_variants(manifest):
+    """List the valid images that got no srcset variants."""
+    return [url for url, entry in manifest["images"].items() if entry["ok"] and not entry.get("variants")
+            and any(variant_width < entry["width"] for variant_width in IMAGE_VARIANT_WIDTHS)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Probe catalog images and write the image manifest.")
+    parser.add_argument("--output", default=image_utils.IMAGE_MANIFEST_PATH, help="Manifest file to write")
+    parser.add_argument("--concurrency", type=int, default=16, help="Number of images probed at once")
+    parser.add_argument("--url-file", help="Probe the URLs in this file (one per line) instead of the catalogs")
+    parser.add_argument("--base-url",
+                        help="Download every image from this server, keeping its path and query "
+                             "(e.g. http://127.0.0.1:8000 for a local stand-in); the manifest keeps the original URLs")
+    args = parser.parse_args(argv)
+
+    urls = read_url_file(args.url_file) if args.url_file else catalog_image_urls()
+    manifest = build_manifest(urls, args.concurrency, base_url=args.base_url)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    failed = {url: entry for url, entry in manifest["images"].items() if not entry["ok"]}
+    broken = [url for url, entry in failed.items() if entry["broken"]]
+    total_bytes = sum(entry["bytes"] or 0 for entry in manifest["images"].values())
+    print(f"Probed {len(manifest['images'])} images ({total_bytes} bytes), "
+          f"{len(broken)} broken, {len(failed) - len(broken)} failed transiently")
+    for url, entry in failed.items():
+        label = "BROKEN" if entry["broken"] else "FAILED"
+        print(f"{label} {entry['status'] or entry.get('error')}: {url}")
+
+    no_variants = missing_variants(manifest)
+    if no_variants:
+        print(f"WARNING: {len(no_variants)} images larger than the srcset widths got no variants "
+              f"and will be served full size. Set IMAGE_VARIANT_TEMPLATE to a resizing endpoint, "
+              f"e.g. https://<your-deployment>/_vercel/image?url={{url}}&w={{width}}&q=75", file=sys.stderr)
+        for url in no_variants:
+            print(f"NO VARIANTS: {url}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,216 @@
 import os
+import sys
 from urllib.parse import quote
 import json
+import threading
+from collections import OrderedDict
 import requests
 
 # Get project ID from environment or use default
 VERCEL_PROJECT_ID = os.environ.get('VERCEL_PROJECT_ID', 'hebbkx1anhila5yf')
 
-def get_images_by_category(category, style=None, location=None):
+# White-label tenants mapped to their Vercel Blob project, e.g. {"acme": "abc123"}
+TENANT_PROJECTS = json.loads(os.environ.get('TENANT_PROJECTS', '') or '{}')
+
+# Optional directory of per-project catalogs named <project_id>.json
+CATALOG_DIR = os.environ.get('CATALOG_DIR', '')
+
+# Memory budget for built catalogs across all tenants
+CATALOG_CACHE_MAX_BYTES = int(os.environ.get('CATALOG_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+
+# Manifest of probed images written by image_manifest.py
+IMAGE_MANIFEST_PATH = os.environ.get('IMAGE_MANIFEST_PATH', 'image_manifest.json')
+
+CATEGORIES = ("venues", "dresses", "hairstyles", "cakes")
+
+# Fields copied from a manifest entry onto carousel items
+MANIFEST_ITEM_FIELDS = ("width", "height", "placeholder", "color", "srcset")
+
+_image_manifest = None
+
+# Separator for the search text of an item, style filters never contain it
+_INDEX_SEPARATOR = "\x00"
+
+def resolve_project_id(tenant=None):
+    """
+    Resolve the Vercel Blob project of a tenant.
+    
+    Unknown tenants fall back to the default project so arbitrary tenant
+    names cannot grow the catalog cache.
+    """
+    if not tenant:
+        return VERCEL_PROJECT_ID
+    return TENANT_PROJECTS.get(tenant, VERCEL_PROJECT_ID)
+
+def _estimate_size(obj, seen=None):
+    """Estimate the memory used by a catalog in bytes."""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_estimate_size(k, seen) + _estimate_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(_estimate_size(v, seen) for v in obj)
+    return size
+
+def _index_item(item):
+    """Build the lowercased search text and location of an item."""
+    text = _INDEX_SEPARATOR.join(
+        [item.get("title", ""), item.get("description", "")] + list(item.get("tags", []))
+    ).lower()
+    return (text, item.get("location", "").lower())
+
+def load_image_manifest():
+    """Load the image manifest once, an empty manifest if it was never built."""
+    global _image_manifest
+    if _image_manifest is None:
+        try:
+            with open(IMAGE_MANIFEST_PATH, encoding="utf-8") as f:
+                _image_manifest = json.load(f).get("images", {})
+        except FileNotFoundError:
+            _image_manifest = {}
+        except Exception as e:
+            print(f"Error loading image manifest: {e}")
+            _image_manifest = {}
+    return _image_manifest
+
+def apply_image_manifest(items, drop_broken=True):
+    """
+    Add dimensions, placeholders and srcset from the image manifest to items.
+    
+    Args:
+        items: Carousel items
+        drop_broken: Drop items whose image is broken (missing or not an image)
+        
+    Returns:
+        New list of items
+    """
+    manifest = load_image_manifest()
+    if not manifest:
+        return items
+    
+    result = []
+    for item in items:
+        entry = manifest.get(item.get("image") or item.get("share_url", ""))
+        if entry is not None and entry.get("broken") and drop_broken:
+            continue
+        # Transient probe failures keep the item without manifest fields
+        if entry is None or not entry.get("ok"):
+            result.append(item)
+            continue
+        item = dict(item)
+        for field in MANIFEST_ITEM_FIELDS:
+            if entry.get(field):
+                item[field] = entry[field]
+        result.append(item)
+    return result
+
+def load_catalog_items(project_id):
+    """
+    Get the raw catalog items of a project per category.
+    
+    The catalog is read from CATALOG_DIR/<project_id>.json when present,
+    otherwise the built-in catalog is used with the project's blob URLs.
+    """
+    catalog_file = os.path.join(CATALOG_DIR, f"{project_id}.json") if CATALOG_DIR else None
+    if catalog_file and os.path.isfile(catalog_file):
+        with open(catalog_file, encoding="utf-8") as f:
+            data = json.load(f)
+        items = {category: list(data.get(category, [])) for category in CATEGORIES}
+    else:
+        items = {
+            "venues": get_venue_images(project_id),
+            "dresses": get_dress_images(project_id),
+            "hairstyles": get_hairstyle_images(project_id),
+            "cakes": get_cake_images(project_id)
+        }
+    return items
+
+def load_catalog(project_id):
+    """
+    Build the catalog and search index of a project.
+    
+    Items whose image is broken in the image manifest are dropped.
+    
+    Returns:
+        Dictionary with items and index lists per category
+    """
+    return build_catalog({
+        category: apply_image_manifest(category_items)
+        for category, category_items in load_catalog_items(project_id).items()
+    })
+
+def build_catalog(items):
+    """Build a catalog and its search index from item lists per category."""
+    return {
+        "items": items,
+        "index": {category: [_index_item(item) for item in items.get(category, [])] for category in items}
+    }
+
+class CatalogCache:
+    """LRU cache of built catalogs keyed by project, bounded by estimated memory."""
+    
+    def __init__(self, max_bytes=CATALOG_CACHE_MAX_BYTES, loader=load_catalog):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._loader = loader
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {}
+    
+    def _lookup(self, project_id):
+        entry = self._entries.get(project_id)
+        if entry is None:
+            return None
+        self._entries.move_to_end(project_id)
+        return entry[0]
+    
+    def get(self, project_id):
+        """Get the catalog of a project, building it on first access."""
+        with self._lock:
+            catalog = self._lookup(project_id)
+            if catalog is not None:
+                return catalog
+            load_lock = self._loading.setdefault(project_id, threading.Lock())
+        
+        # Only one thread builds a given project's catalog
+        with load_lock:
+            with self._lock:
+                catalog = self._lookup(project_id)
+                if catalog is not None:
+                    return catalog
+            
+            catalog = self._loader(project_id)
+            size = _estimate_size(catalog)
+            with self._lock:
+                self._entries[project_id] = (catalog, size)
+                self.total_bytes += size
+                # Evict least recently used catalogs, always keeping the new one
+                while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+                    _, (_, evicted_size) = self._entries.popitem(last=False)
+                    self.total_bytes -= evicted_size
+                self._loading.pop(project_id, None)
+            return catalog
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+    
+    def stats(self):
+        with self._lock:
+            return {
+                "projects": list(self._entries),
+                "total_bytes": self.total_bytes,
+                "max_bytes": self.max_bytes
+            }
+
+catalog_cache = CatalogCache()
+
+def get_images_by_category(category, style=None, location=None, tenant=None):
     """
     Get images for a category with optional filters.
     
@@ -14,46 +218,36 @@ def get_images_by_category(category, style=None, location=None):
         category: Type of images (venues, dresses, hairstyles, cakes)
         style: Optional style filter
         location: Optional location filter
+        tenant: Optional tenant whose catalog is used
         
     Returns:
         Dictionary with image data
     """
     try:
-        # Call the appropriate function based on category
-        if category.lower() == "venues":
-            items = get_venue_images()
-        elif category.lower() == "dresses":
-            items = get_dress_images()
-        elif category.lower() == "hairstyles":
-            items = get_hairstyle_images()
-        elif category.lower() == "cakes":
-            items = get_cake_images()
-        else:
-            # Default: empty items
-            items = []
+        catalog = catalog_cache.get(resolve_project_id(tenant))
+        
+        # Pair each item with its search index entry, unknown categories have no items
+        entries = list(zip(catalog["items"].get(category.lower(), []), catalog["index"].get(category.lower(), [])))
         
         # Apply style filter if provided
-        if style and items:
-            filtered_items = []
-            for item in items:
-                # Check title, description, and tags
-                if (style.lower() in item.get("title", "").lower() or 
-                    style.lower() in item.get("description", "").lower() or 
-                    any(style.lower() in tag.lower() for tag in item.get("tags", []))):
-                    filtered_items.append(item)
+        if style and entries:
+            style_lower = style.lower()
+            # Check title, description, and tags
+            filtered_entries = [entry for entry in entries if style_lower in entry[1][0]]
             # Only apply filter if we found matches
-            if filtered_items:
-                items = filtered_items
+            if filtered_entries:
+                entries = filtered_entries
         
         # Apply location filter if provided for venues
-        if location and category.lower() == "venues" and items:
-            filtered_items = []
-            for item in items:
-                if location.lower() in item.get("location", "").lower():
-                    filtered_items.append(item)
+        if location and category.lower() == "venues" and entries:
+            location_lower = location.lower()
+            filtered_entries = [entry for entry in entries if location_lower in entry[1][1]]
             # Only apply filter if we found matches
-            if filtered_items:
-                items = filtered_items
+            if filtered_entries:
+                entries = filtered_entries
+        
+        # Copy items so the cached catalog is never modified
+        items = [dict(item) for item, _ in entries]
         
         # Verify that all items have valid fields
         for item in items:
@@ -85,7 +279,7 @@ def get_images_by_category(category, style=None, location=None):
         
         # Make sure we have at least one item
         if not items:
-            items = get_fallback_images(category)
+            items = apply_image_manifest(get_fallback_images(category), drop_broken=False)
         
         # Return the formatted response
         return {
@@ -115,9 +309,13 @@ def get_options_for_category(category):
     }
     return all_options.get(category.lower(), ["Show me venues", "Show me dresses"])
 
-def get_venue_images():
+def blob_base_url(project_id=None):
+    """Get the Vercel Blob Storage base URL of a project."""
+    return f"https://{project_id or VERCEL_PROJECT_ID}.public.blob.vercel-storage.com"
+
+def get_venue_images(project_id=None):
     """Get venue images from Vercel Blob Storage."""
-    base_url = f"https://{VERCEL_PROJECT_ID}.public.blob.vercel-storage.com"
+    base_url = blob_base_url(project_id)
     folder = "wedding venues"
     
     return [
@@ -163,9 +361,9 @@ def get_venue_images():
         }
     ]
 
-def get_dress_images():
+def get_dress_images(project_id=None):
     """Get dress images from Vercel Blob Storage."""
-    base_url = f"https://{VERCEL_PROJECT_ID}.public.blob.vercel-storage.com"
+    base_url = blob_base_url(project_id)
     folder = "wedding dresses"
     
     return [
@@ -211,9 +409,9 @@ def get_dress_images():
         }
     ]
 
-def get_hairstyle_images():
+def get_hairstyle_images(project_id=None):
     """Get hairstyle images from Vercel Blob Storage."""
-    base_url = f"https://{VERCEL_PROJECT_ID}.public.blob.vercel-storage.com"
+    base_url = blob_base_url(project_id)
     folder = "wedding hairstyles"
     
     return [
@@ -249,9 +447,9 @@ def get_hairstyle_images():
         }
     ]
 
-def get_cake_images():
+def get_cake_images(project_id=None):
     """Get cake images from Vercel Blob Storage."""
-    base_url = f"https://{VERCEL_PROJECT_ID}.public.blob.vercel-storage.com"
+    base_url = blob_base_url(project_id)
     folder = "wedding cakes"
     
     return [
@@ -0,0 +1,235 @@
+import os
+import copy
+import json
+import time
+import hashlib
+import threading
+from functools import wraps
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from traffic_capture import collect_llm_responses, add_llm_responses
+
+# Prefetch is off unless PREFETCH_ENABLED is set
+PREFETCH_ENABLED = os.environ.get('PREFETCH_ENABLED', '').lower() in ('1', 'true', 'yes')
+
+# Number of predicted options prefetched after each turn
+PREFETCH_TOP_N = int(os.environ.get('PREFETCH_TOP_N', '2'))
+
+# Speculative turns running or queued at once
+PREFETCH_CONCURRENCY = int(os.environ.get('PREFETCH_CONCURRENCY', '2'))
+
+# Speculative turns (each at most one LLM call) started per minute
+PREFETCH_MAX_PER_MINUTE = int(os.environ.get('PREFETCH_MAX_PER_MINUTE', '30'))
+
+# Seconds a prefetched turn stays usable
+PREFETCH_TTL = float(os.environ.get('PREFETCH_TTL', '300'))
+
+# Seconds to wait for a matching prefetch that is still running
+PREFETCH_WAIT_TIMEOUT = float(os.environ.get('PREFETCH_WAIT_TIMEOUT', '30'))
+
+# Sessions with prefetched turns kept at once
+PREFETCH_MAX_SESSIONS = int(os.environ.get('PREFETCH_MAX_SESSIONS', '1000'))
+
+
+def turn_key(data):
+    """
+    Build the key that identifies a turn for prefetching.
+
+    Two turns with the same key produce the same carousel and prompt: the same
+    conversation, state and tenant. The whole conversation is hashed because the
+    prefetched LLM reply was generated from it, so a request with other history
+    never gets that reply.
+    """
+    messages = data.get("messages") or []
+    last = messages[-1] if messages else None
+    content = last.get("content", "") if isinstance(last, dict) else ""
+    history = hashlib.sha256(json.dumps(messages, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    return json.dumps([content, history, data.get("state") or {}, data.get("tenant")], sort_keys=True, default=str)
+
+
+def predicted_turns(data, response, top_n=PREFETCH_TOP_N):
+    """
+    Build the requests of the next turns a user is likely to send.
+
+    The options of a response are ordered by how likely they are, so the first
+    top_n options are taken as the user's next message.
+    """
+    messages = list(data.get("messages") or [])
+    if response.get("text"):
+        messages.append({"role": "assistant", "content": response["text"]})
+
+    turns = []
+    for option in (response.get("options") or [])[:top_n]:
+        turn = {
+            "messages": messages + [{"role": "user", "content": option}],
+            "state": copy.deepcopy(response.get("state") or {}),
+            "session_id": data.get("session_id")
+        }
+        if data.get("tenant"):
+            turn["tenant"] = data["tenant"]
+        turns.append(turn)
+    return turns
+
+
+class PrefetchJob:
+    """A speculative turn for one session."""
+
+    def __init__(self, future):
+        self.future = future
+        self.created = time.monotonic()
+        self.cancelled = False
+
+    def cancel(self):
+        # A turn already running cannot be interrupted, its result is discarded
+        self.cancelled = True
+        self.future.cancel()
+
+
+class Prefetcher:
+    """Runs speculative next turns in the background within a concurrency and spend budget."""
+
+    def __init__(self, concurrency=PREFETCH_CONCURRENCY, max_per_minute=PREFETCH_MAX_PER_MINUTE,
+                 ttl=PREFETCH_TTL, max_sessions=PREFETCH_MAX_SESSIONS):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_per_minute = max_per_minute
+        self._executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="prefetch")
+        self._capacity = threading.BoundedSemaphore(max(1, concurrency))
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._tokens = float(max_per_minute)
+        self._refilled = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self.cancelled = 0
+        self.skipped = 0
+
+    def _spend(self):
+        """Take one turn from the per-minute budget, False when it is used up."""
+        now = time.monotonic()
+        self._tokens = min(self.max_per_minute, self._tokens + (now - self._refilled) * self.max_per_minute / 60.0)
+        self._refilled = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def take(self, session_id, data):
+        """
+        Get the prefetched result of a turn and cancel the session's other prefetches.
+
+        Returns:
+            Tuple of (response, LLM responses), or None on a miss
+        """
+        key = turn_key(data)
+        with self._lock:
+            jobs = self._sessions.pop(session_id, {})
+            job = jobs.pop(key, None)
+            for other in jobs.values():
+                other.cancel()
+            self.cancelled += len(jobs)
+
+        result = None
+        if job is not None and not job.cancelled and time.monotonic() - job.created <= self.ttl:
+            try:
+                result = job.future.result(timeout=PREFETCH_WAIT_TIMEOUT)
+            except Exception as e:
+                print(f"Error using prefetched turn: {e}")
+
+        with self._lock:
+            if result is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return copy.deepcopy(result)
+
+    def schedule(self, func, session_id, data, response):
+        """Start speculative turns for the likely next options of a response."""
+        jobs = {}
+        for turn in predicted_turns(data, response):
+            # Only use spare capacity, never queue behind running prefetches
+            if not self._capacity.acquire(blocking=False):
+                with self._lock:
+                    self.skipped += 1
+                continue
+            with self._lock:
+                within_budget = self._spend()
+                if not within_budget:
+                    self.skipped += 1
+            if not within_budget:
+                self._capacity.release()
+                continue
+            # Key the turn before it runs, process_message updates its state
+            key = turn_key(turn)
+            job = PrefetchJob(None)
+            try:
+                job.future = self._executor.submit(self._run, job, func, turn)
+            except RuntimeError:
+                self._capacity.release()
+                break
+            job.future.add_done_callback(lambda _: self._capacity.release())
+            jobs[key] = job
+
+        if not jobs:
+            return
+        with self._lock:
+            self._sessions[session_id] = jobs
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                _, evicted = self._sessions.popitem(last=False)
+                for job in evicted.values():
+                    job.cancel()
+
+    def _run(self, job, func, turn):
+        if job.cancelled:
+            return None
+        response, llm_responses, failed = collect_llm_responses(func, turn)
+        # A failed turn holds fallback text, the real request calls the LLM live instead
+        if failed or job.cancelled:
+            return None
+        return response, llm_responses
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "cancelled": self.cancelled,
+                "skipped": self.skipped,
+                "sessions": len(self._sessions)
+            }
+
+
+prefetcher = Prefetcher() if PREFETCH_ENABLED else None
+
+
+def prefetched(func):
+    """
+    Decorator that serves turns from speculative prefetches and schedules the next ones.
+
+    Only requests with a session_id take part. When PREFETCH_ENABLED is not set the
+    function is returned unchanged.
+    """
+    if not PREFETCH_ENABLED:
+        return func
+
+    @wraps(func)
+    def wrapper(data):
+        session_id = data.get("session_id") if isinstance(data, dict) else None
+        if not session_id:
+            return func(data)
+
+        hit = prefetcher.take(session_id, data)
+        if hit is not None:
+            response, llm_responses = hit
+            add_llm_responses(llm_responses)
+        else:
+            response = func(data)
+
+        try:
+            prefetcher.schedule(func, session_id, data, response)
+        except Exception as e:
+            print(f"Error scheduling prefetch: {e}")
+        return response
+    return wrapper
@@ -0,0 +1,227 @@
+import os
+import sys
+import time
+import hmac
+import uuid
+import random
+import pstats
+import cProfile
+import threading
+from functools import wraps
+from contextvars import ContextVar
+from collections import Counter
+
+# Profiling is off unless a token or a sampling rate is configured
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN', '')
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0') or 0)
+PROFILE_MODE = os.environ.get('PROFILE_MODE', 'cprofile')
+PROFILE_OUTPUT_DIR = os.environ.get('PROFILE_OUTPUT_DIR', 'profiles')
+PROFILE_SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL', '0.005') or 0.005)
+
+PROFILE_HEADER = 'X-SayYes-Profile'
+PROFILE_MODE_HEADER = 'X-SayYes-Profile-Mode'
+
+# Request body fields that opt a call into profiling where there are no headers
+PROFILE_FIELD = 'profile'
+PROFILE_MODE_FIELD = 'profile_mode'
+
+PROFILING_ENABLED = bool(PROFILE_TOKEN) or PROFILE_SAMPLE_RATE > 0
+
+PROFILE_MODES = ("cprofile", "sample")
+
+# The profiling session of the request running in the current context
+_current_session = ContextVar("profile_session", default=None)
+
+# cProfile can only have one active profiler per process on newer Pythons,
+# so only one deterministic profile runs at a time
+_cprofile_lock = threading.Lock()
+
+
+class StackSampler:
+    """Statistical profiler that samples the stack of a single thread."""
+
+    def __init__(self, thread_id, interval=PROFILE_SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+
+    def collapsed(self):
+        """Return the samples in collapsed-stack format for flame graph tools."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+class ProfileSession:
+    """A single profiled request."""
+
+    def __init__(self, name, mode):
+        self.name = name
+        self.mode = mode
+        self.intent = None
+        self.path = None
+        self._profiler = None
+
+    def start(self):
+        if self.mode == "sample":
+            self._profiler = StackSampler(threading.get_ident())
+            self._profiler.start()
+        else:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def stop(self):
+        if self.mode == "sample":
+            self._profiler.stop()
+        else:
+            self._profiler.disable()
+
+    def write(self):
+        """Write the profile to PROFILE_OUTPUT_DIR and return its path."""
+        os.makedirs(PROFILE_OUTPUT_DIR, exist_ok=True)
+        filename = "{}_{}_{}_{}".format(
+            time.strftime("%Y%m%d-%H%M%S"),
+            _safe_tag(self.name),
+            _safe_tag(self.intent or "unknown"),
+            uuid.uuid4().hex[:8]
+        )
+        if self.mode == "sample":
+            self.path = os.path.join(PROFILE_OUTPUT_DIR, filename + ".collapsed")
+            with open(self.path, "w") as f:
+                f.write(self._profiler.collapsed())
+        else:
+            self.path = os.path.join(PROFILE_OUTPUT_DIR, filename + ".pstats")
+            pstats.Stats(self._profiler).dump_stats(self.path)
+        return self.path
+
+
+def _safe_tag(value):
+    return "".join(c if c.isalnum() or c in "-_" else "-" for c in str(value))[:40]
+
+
+def tag_intent(intent):
+    """Tag the active profile (if any) with the detected intent."""
+    session = _current_session.get()
+    if session is not None:
+        session.intent = intent
+
+
+def is_valid_token(token):
+    """Check a debug token against PROFILE_TOKEN."""
+    if not PROFILE_TOKEN or not isinstance(token, str):
+        return False
+    return hmac.compare_digest(token.encode("utf-8"), PROFILE_TOKEN.encode("utf-8"))
+
+
+def requested_mode(headers, body=None):
+    """
+    Decide whether a request should be profiled.
+
+    Args:
+        headers: Request headers (any mapping with a get method)
+        body: Optional request body that can opt in with the token in its "profile" field
+
+    Returns:
+        The profiling mode to use, or None if the request should not be profiled
+    """
+    if headers is not None and is_valid_token(headers.get(PROFILE_HEADER)):
+        mode = headers.get(PROFILE_MODE_HEADER, PROFILE_MODE)
+        return mode if mode in PROFILE_MODES else PROFILE_MODE
+    if isinstance(body, dict) and is_valid_token(body.get(PROFILE_FIELD)):
+        mode = body.get(PROFILE_MODE_FIELD, PROFILE_MODE)
+        return mode if mode in PROFILE_MODES else PROFILE_MODE
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return PROFILE_MODE
+    return None
+
+
+def run_profiled(name, mode, func, *args, **kwargs):
+    """
+    Run func under the profiler and write the result to PROFILE_OUTPUT_DIR.
+
+    The profile is written even when func raises, then the error is re-raised.
+
+    Returns:
+        Tuple of (func result, profile path or None)
+    """
+    if mode != "sample" and not _cprofile_lock.acquire(blocking=False):
+        # Another request holds the deterministic profiler, sample this one instead
+        print(f"Profiler busy, sampling {name} instead of cProfile")
+        mode = "sample"
+
+    session = ProfileSession(name, mode)
+    token = _current_session.set(session)
+    try:
+        session.start()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            session.stop()
+            try:
+                session.write()
+            except Exception as e:
+                print(f"Error writing profile for {name}: {e}")
+    finally:
+        _current_session.reset(token)
+        if mode != "sample":
+            _cprofile_lock.release()
+    return result, session.path
+
+
+def profiled(name, get_headers=None, body_opt_in=False):
+    """
+    Decorator that profiles individual calls of the wrapped function.
+
+    When neither PROFILE_TOKEN nor PROFILE_SAMPLE_RATE is configured the function
+    is returned unchanged, so there is no overhead when profiling is off.
+
+    Args:
+        name: Name used to tag the profile output
+        get_headers: Optional callable returning the current request headers
+        body_opt_in: Whether the first argument is a request body that can opt in
+            with the token in its "profile" field (and the mode in "profile_mode")
+    """
+    def decorator(func):
+        if not PROFILING_ENABLED:
+            return func
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            # Already inside a profiled request, the outer profile covers this call
+            if _current_session.get() is not None:
+                return func(*args, **kwargs)
+            body = args[0] if body_opt_in and args else None
+            mode = requested_mode(get_headers() if get_headers else None, body)
+            if not mode:
+                return func(*args, **kwargs)
+            result, _ = run_profiled(name, mode, func, *args, **kwargs)
+            return result
+        return wrapper
+    return decorator
+
+
+def list_profiles():
+    """List the profiles written to PROFILE_OUTPUT_DIR, newest first."""
+    if not os.path.isdir(PROFILE_OUTPUT_DIR):
+        return []
+    names = [n for n in os.listdir(PROFILE_OUTPUT_DIR) if n.endswith((".pstats", ".collapsed"))]
+    return sorted(names, reverse=True)
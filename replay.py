@@ -0,0 +1,226 @@
+"""
+Replay captured traffic against the current build.
+
+Usage:
+    python replay.py captures/traffic.jsonl
+    python replay.py captures/traffic.jsonl --speed 0 --output replay_new.json
+    python replay.py captures/traffic.jsonl --speed 0 --baseline replay_old.json --threshold 1.2
+
+LLM responses are served from the recording, so a replay never calls OpenAI.
+Without a baseline, outputs are diffed against the recording. With a baseline
+(the --output of an earlier replay), latencies and outputs are diffed against it.
+"""
+import os
+import sys
+import json
+import math
+import time
+import copy
+import argparse
+
+# Never call the real LLM, capture or prefetch while replaying
+os.environ.pop("OPENAI_API_KEY", None)
+os.environ["CAPTURE_TRAFFIC"] = ""
+os.environ["PREFETCH_ENABLED"] = ""
+
+from traffic_capture import load_records, replay_call
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies):
+    """Summarize a latency distribution in milliseconds."""
+    return {
+        "count": len(latencies),
+        "mean": sum(latencies) / len(latencies) if latencies else 0.0,
+        "p50": percentile(latencies, 50),
+        "p90": percentile(latencies, 90),
+        "p99": percentile(latencies, 99),
+        "max": max(latencies) if latencies else 0.0
+    }
+
+
+def first_difference(expected, actual, path=""):
+    """Return the path of the first difference between two JSON values, or None."""
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        for key in sorted(set(expected) | set(actual)):
+            diff = first_difference(expected.get(key), actual.get(key), f"{path}.{key}")
+            if diff:
+                return diff
+        return None
+    if isinstance(expected, list) and isinstance(actual, list):
+        if len(expected) != len(actual):
+            return f"{path} (length {len(expected)} != {len(actual)})"
+        for i, (a, b) in enumerate(zip(expected, actual)):
+            diff = first_difference(a, b, f"{path}[{i}]")
+            if diff:
+                return diff
+        return None
+    return None if expected == actual else (path or "<root>")
+
+
+def detect_record_intent(record, response):
+    """Get the intent of a replayed turn for grouping latencies."""
+    if record["endpoint"] == "process_message":
+        from sayyes_agent import detect_intent
+        messages = (record.get("request") or {}).get("messages") or []
+        if not messages:
+            return "greeting"
+        last = messages[-1].get("content", "") if isinstance(messages[-1], dict) else ""
+        return detect_intent(last.lower() if isinstance(last, str) else "", record.get("state_before") or {})
+    return response.get("stage", "unknown") if isinstance(response, dict) else "unknown"
+
+
+def replay_record(record, client):
+    """Re-drive one recorded turn and return its output and latency."""
+    request = copy.deepcopy(record.get("request"))
+    if record["endpoint"] == "process_message":
+        from sayyes_agent import process_message
+        start = time.perf_counter()
+        response = replay_call(record, process_message, request)
+        latency_ms = (time.perf_counter() - start) * 1000
+        # process_message returns its state object, copy it before the next turn mutates it
+        response = json.loads(json.dumps(response, default=str))
+    elif record["endpoint"] == "api_chat":
+        start = time.perf_counter()
+        result = replay_call(record, client.post, "/api/chat", json=request)
+        latency_ms = (time.perf_counter() - start) * 1000
+        response = result.get_json(silent=True)
+    else:
+        raise ValueError(f"Unknown endpoint in capture: {record['endpoint']}")
+    return {
+        "id": record["id"],
+        "endpoint": record["endpoint"],
+        "intent": detect_record_intent(record, response),
+        "latency_ms": latency_ms,
+        "response": response
+    }
+
+
+def replay(records, speed=1.0):
+    """
+    Replay records in capture order.
+
+    Args:
+        records: Capture records
+        speed: Pacing multiplier, 1.0 keeps the recorded gaps between turns,
+            2.0 halves them and 0 replays back to back
+
+    Returns:
+        List of replay results
+    """
+    client = None
+    if any(record["endpoint"] == "api_chat" for record in records):
+        from app import app
+        client = app.test_client()
+
+    records = sorted(records, key=lambda r: r.get("ts", 0))
+    first_ts = records[0].get("ts", 0) if records else 0
+    started = time.perf_counter()
+    results = []
+    for record in records:
+        if speed > 0:
+            delay = (record.get("ts", 0) - first_ts) / speed - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+        results.append(replay_record(record, client))
+    return results
+
+
+def group_latencies(results):
+    groups = {}
+    for result in results:
+        for key in (result["endpoint"], f"{result['endpoint']}:{result['intent']}"):
+            groups.setdefault(key, []).append(result["latency_ms"])
+    return groups
+
+
+def compare(results, expected_by_id, baseline_latencies, threshold):
+    """
+    Compare replay results to expected outputs and baseline latencies.
+
+    Returns:
+        Tuple of (report lines, list of failures)
+    """
+    lines = []
+    failures = []
+
+    current = group_latencies(results)
+    lines.append(f"{'group':40} {'n':>5} {'p50':>9} {'p90':>9} {'p99':>9} {'base p90':>9} {'ratio':>7}")
+    for key in sorted(current):
+        stats = summarize(current[key])
+        base = summarize(baseline_latencies[key]) if key in baseline_latencies else None
+        ratio = stats["p90"] / base["p90"] if base and base["p90"] else None
+        lines.append("{:40} {:>5} {:>9.2f} {:>9.2f} {:>9.2f} {:>9} {:>7}".format(
+            key, stats["count"], stats["p50"], stats["p90"], stats["p99"],
+            f"{base['p90']:.2f}" if base else "-",
+            f"{ratio:.2f}" if ratio else "-"
+        ))
+        if ratio and threshold and ratio > threshold:
+            failures.append(f"{key}: p90 {stats['p90']:.2f}ms is {ratio:.2f}x the baseline")
+
+    mismatches = 0
+    for result in results:
+        if result["id"] not in expected_by_id:
+            continue
+        diff = first_difference(expected_by_id[result["id"]], result["response"])
+        if diff:
+            mismatches += 1
+            if mismatches <= 10:
+                lines.append(f"output differs for {result['endpoint']} turn {result['id']} at {diff}")
+    lines.append(f"{mismatches} of {len(results)} outputs differ")
+    if mismatches:
+        failures.append(f"{mismatches} outputs differ")
+    return lines, failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay captured traffic against the current build.")
+    parser.add_argument("capture", help="Capture file written with CAPTURE_TRAFFIC enabled")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Pacing multiplier (1 = recorded pacing, 0 = back to back)")
+    parser.add_argument("--baseline", help="Results of an earlier replay to compare against")
+    parser.add_argument("--output", help="Write the replay results to this file")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="Fail when a p90 latency exceeds the baseline by this factor")
+    parser.add_argument("--ignore-output", action="store_true", help="Do not fail on output differences")
+    args = parser.parse_args(argv)
+
+    records = load_records(args.capture)
+    results = replay(records, args.speed)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        expected_by_id = {result["id"]: result["response"] for result in baseline}
+        baseline_latencies = group_latencies(baseline)
+    else:
+        # Recorded latencies include real LLM calls, so they are only shown for reference
+        expected_by_id = {record["id"]: record.get("response") for record in records}
+        baseline_latencies = {}
+        recorded = [r.get("latency_ms", 0) for r in records]
+        print("recorded latency (with live LLM): " + ", ".join(
+            f"{k} {v:.2f}ms" for k, v in summarize(recorded).items() if k != "count"))
+
+    lines, failures = compare(results, expected_by_id, baseline_latencies, args.threshold)
+    print("\n".join(lines))
+    if args.ignore_output:
+        failures = [f for f in failures if not f.endswith("outputs differ")]
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
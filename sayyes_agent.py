@@ -3,6 +3,9 @@ import json
 import requests
 from openai import OpenAI
 from image_utils import get_images_by_category
+from profiling_utils import profiled, tag_intent
+from traffic_capture import captured, recorded_llm, mark_turn_failed
+from prefetch import prefetched
 
 # Load OpenAI API key from environment
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
@@ -15,6 +18,7 @@ try:
 except Exception as e:
     print(f"Error initializing OpenAI client: {e}")
 
+@recorded_llm
 def get_ai_response(messages, prompt=None):
     """Get response from OpenAI"""
     try:
@@ -48,14 +52,19 @@ def get_ai_response(messages, prompt=None):
         return response.choices[0].message.content
     except Exception as e:
         print(f"Error getting AI response: {e}")
+        mark_turn_failed()
         return generate_fallback_response(messages[-1]["content"] if messages else "")
 
+@profiled("process_message", body_opt_in=True)
+@captured("process_message")
+@prefetched
 def process_message(data):
     """
     Process a message and return the response.
     
     Args:
-        data: Dictionary containing messages and state
+        data: Dictionary containing messages, state and an optional tenant, session_id
+            and profile (the profiling token)
         
     Returns:
         Dictionary with response text and updated state
@@ -64,6 +73,7 @@ def process_message(data):
         # Extract messages and state from the request
         messages = data.get("messages", [])
         state = data.get("state", {})
+        tenant = data.get("tenant")
         
         # Initialize state if empty
         if not state:
@@ -77,6 +87,7 @@ def process_message(data):
         
         # Get the last message from the user
         if not messages or len(messages) == 0:
+            tag_intent("greeting")
             return {
                 "text": "Hey! I'm your AI wedding planner. Ready to explore your dream day?",
                 "options": ["Show me venues", "Show me dresses", "Show me hairstyles", "Help with wedding party"],
@@ -87,34 +98,23 @@ def process_message(data):
         last_message = messages[-1].get("content", "") if isinstance(messages[-1], dict) else ""
         message_lower = last_message.lower() if isinstance(last_message, str) else ""
         
+        intent = detect_intent(message_lower, state)
+        tag_intent(intent)
+        
         # Check for venue-related queries
-        if ("venue" in message_lower or "location" in message_lower) and not state.get("seen_venues", False):
+        if intent == "venues":
             state["seen_venues"] = True
             
             # Extract style and location if present
-            style = None
-            location = None
-            
-            if "rustic" in message_lower:
-                style = "rustic"
-            elif "modern" in message_lower:
-                style = "modern"
-            elif "elegant" in message_lower or "luxury" in message_lower:
-                style = "luxury"
-            elif "bohemian" in message_lower or "boho" in message_lower:
-                style = "bohemian"
-            
-            # Extract location - basic implementation
-            if "in " in message_lower:
-                location = message_lower.split("in ")[-1].strip()
-                location = location.split()[0]  # Take the first word after "in"
+            style = extract_style(message_lower)
+            location = extract_location(message_lower)
             
             # Get AI response
             ai_prompt = "You are a helpful and enthusiastic wedding assistant. Give a short, friendly response about wedding venues. Use emojis and keep it casual."
             ai_response = get_ai_response(messages, ai_prompt)
             
             # Provide venue data
-            venue_data = get_images_by_category("venues", style, location)
+            venue_data = get_images_by_category("venues", style, location, tenant=tenant)
             
             return {
                 "text": ai_response or "Check out these gorgeous venues! Any catching your eye? 👀",
@@ -124,26 +124,18 @@ def process_message(data):
             }
         
         # Check for dress-related queries
-        elif ("dress" in message_lower or "gown" in message_lower) and not state.get("seen_dresses", False):
+        elif intent == "dresses":
             state["seen_dresses"] = True
             
             # Extract style if present
-            style = None
-            if "rustic" in message_lower:
-                style = "rustic"
-            elif "modern" in message_lower:
-                style = "modern"
-            elif "elegant" in message_lower or "luxury" in message_lower:
-                style = "luxury"
-            elif "bohemian" in message_lower or "boho" in message_lower:
-                style = "bohemian"
+            style = extract_style(message_lower)
             
             # Get AI response
             ai_prompt = "You are a helpful and enthusiastic wedding assistant. Give a short, friendly response about wedding dresses. Use emojis and keep it casual."
             ai_response = get_ai_response(messages, ai_prompt)
             
             # Provide dress data
-            dress_data = get_images_by_category("dresses", style)
+            dress_data = get_images_by_category("dresses", style, tenant=tenant)
             
             return {
                 "text": ai_response or "These dresses are giving MAIN CHARACTER energy! ✨",
@@ -153,26 +145,18 @@ def process_message(data):
             }
         
         # Check for hairstyle-related queries
-        elif ("hair" in message_lower or "hairstyle" in message_lower) and not state.get("seen_hairstyles", False):
+        elif intent == "hairstyles":
             state["seen_hairstyles"] = True
             
             # Extract style if present
-            style = None
-            if "rustic" in message_lower:
-                style = "rustic"
-            elif "modern" in message_lower:
-                style = "modern"
-            elif "elegant" in message_lower or "luxury" in message_lower:
-                style = "luxury"
-            elif "bohemian" in message_lower or "boho" in message_lower:
-                style = "bohemian"
+            style = extract_style(message_lower)
             
             # Get AI response
             ai_prompt = "You are a helpful and enthusiastic wedding assistant. Give a short, friendly response about wedding hairstyles. Use emojis and keep it casual."
             ai_response = get_ai_response(messages, ai_prompt)
             
             # Provide hairstyle data
-            hairstyle_data = get_images_by_category("hairstyles", style)
+            hairstyle_data = get_images_by_category("hairstyles", style, tenant=tenant)
             
             return {
                 "text": ai_response or "Hair is everything! Check these out! 💇‍♀️",
@@ -182,7 +166,7 @@ def process_message(data):
             }
         
         # Check for wedding party help
-        elif "wedding party" in message_lower or "party" in message_lower:
+        elif intent == "wedding_party":
             # Get AI response
             ai_prompt = "You are a helpful and enthusiastic wedding assistant. Give advice about wedding party planning and responsibilities. Use emojis and keep it casual."
             ai_response = get_ai_response(messages, ai_prompt)
@@ -194,13 +178,13 @@ def process_message(data):
             }
         
         # Check for cake-related queries
-        elif "cake" in message_lower:
+        elif intent == "cakes":
             # Get AI response
             ai_prompt = "You are a helpful and enthusiastic wedding assistant. Give advice about wedding cakes. Use emojis and keep it casual."
             ai_response = get_ai_response(messages, ai_prompt)
             
             # Provide cake data
-            cake_data = get_images_by_category("cakes")
+            cake_data = get_images_by_category("cakes", tenant=tenant)
             
             return {
                 "text": ai_response or "Here are some delicious wedding cake designs! 🎂",
@@ -210,7 +194,7 @@ def process_message(data):
             }
         
         # Check if we've shown enough content to show a soft CTA
-        if (state.get("seen_venues") or state.get("seen_dresses") or state.get("seen_hairstyles")) and not state.get("soft_cta_shown"):
+        if intent == "soft_cta":
             state["soft_cta_shown"] = True
             
             # Get AI response
@@ -226,7 +210,7 @@ def process_message(data):
             }
         
         # Check if we've shown enough content to show a final CTA
-        if state.get("seen_venues") and state.get("seen_dresses") and state.get("seen_hairstyles") and not state.get("cta_shown"):
+        if intent == "cta":
             state["cta_shown"] = True
             
             # Get AI response
@@ -253,11 +237,61 @@ def process_message(data):
     
     except Exception as e:
         print(f"Error processing message: {e}")
+        mark_turn_failed()
         return {
             "text": "I'm sorry, but I encountered an error processing your message. Please try again.",
             "state": state if isinstance(state, dict) else {}
         }
 
+def detect_intent(message_lower, state):
+    """
+    Detect which kind of turn a message is, in the same order process_message handles them.
+    
+    Args:
+        message_lower: Lowercased content of the last user message
+        state: Current conversation state
+        
+    Returns:
+        One of venues, dresses, hairstyles, wedding_party, cakes, soft_cta, cta or chat
+    """
+    if ("venue" in message_lower or "location" in message_lower) and not state.get("seen_venues", False):
+        return "venues"
+    elif ("dress" in message_lower or "gown" in message_lower) and not state.get("seen_dresses", False):
+        return "dresses"
+    elif ("hair" in message_lower or "hairstyle" in message_lower) and not state.get("seen_hairstyles", False):
+        return "hairstyles"
+    elif "wedding party" in message_lower or "party" in message_lower:
+        return "wedding_party"
+    elif "cake" in message_lower:
+        return "cakes"
+    
+    if (state.get("seen_venues") or state.get("seen_dresses") or state.get("seen_hairstyles")) and not state.get("soft_cta_shown"):
+        return "soft_cta"
+    
+    if state.get("seen_venues") and state.get("seen_dresses") and state.get("seen_hairstyles") and not state.get("cta_shown"):
+        return "cta"
+    
+    return "chat"
+
+def extract_style(message_lower):
+    """Extract a style filter from a lowercased message."""
+    if "rustic" in message_lower:
+        return "rustic"
+    elif "modern" in message_lower:
+        return "modern"
+    elif "elegant" in message_lower or "luxury" in message_lower:
+        return "luxury"
+    elif "bohemian" in message_lower or "boho" in message_lower:
+        return "bohemian"
+    return None
+
+def extract_location(message_lower):
+    """Extract a location from a lowercased message - basic implementation."""
+    if "in " in message_lower:
+        location = message_lower.split("in ")[-1].strip()
+        return location.split()[0]  # Take the first word after "in"
+    return None
+
 def get_options_based_on_state(state):
     """Get appropriate options based on the current state."""
     if state.get("seen_venues"):
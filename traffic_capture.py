@@ -0,0 +1,254 @@
+import os
+import re
+import copy
+import json
+import time
+import uuid
+import threading
+from functools import wraps
+from contextvars import ContextVar
+
+# Capture is off unless CAPTURE_TRAFFIC is set
+CAPTURE_TRAFFIC = os.environ.get('CAPTURE_TRAFFIC', '').lower() in ('1', 'true', 'yes')
+CAPTURE_PATH = os.environ.get('CAPTURE_PATH', 'captures/traffic.jsonl')
+
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+PHONE_PATTERN = re.compile(r"\+?\d[\d\s().-]{7,}\d")
+DATE_PATTERN = re.compile(r"\b\d{4}-\d{1,2}-\d{1,2}\b")
+
+# Phone numbers have at least this many digits, shorter runs are dates, prices or counts
+PHONE_MIN_DIGITS = 10
+
+# Fields whose values are replaced in the user-facing text of a record
+SENSITIVE_FIELDS = ("user_name", "name", "email", "phone", "profile")
+
+# Response fields holding conversational text ("description" for /api/chat)
+RESPONSE_TEXT_FIELDS = ("text", "description")
+
+# The capture record of the turn running in the current context
+_current_record = ContextVar("capture_record", default=None)
+
+# LLM responses to serve while replaying a recorded turn
+_replay_responses = ContextVar("replay_responses", default=None)
+
+_write_lock = threading.Lock()
+
+
+def _collect_sensitive(obj, found):
+    """Collect the values of sensitive fields anywhere in obj."""
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            if key in SENSITIVE_FIELDS and isinstance(value, str) and value:
+                found.add(value)
+            else:
+                _collect_sensitive(value, found)
+    elif isinstance(obj, list):
+        for value in obj:
+            _collect_sensitive(value, found)
+    return found
+
+
+def _mask_phone(match):
+    text = match.group(0)
+    if sum(c.isdigit() for c in text) < PHONE_MIN_DIGITS:
+        return text
+    return "<phone>"
+
+
+def _mask_phones(text):
+    """Mask phone numbers, leaving ISO dates (such as wedding dates) as they are."""
+    parts = []
+    last = 0
+    # Mask between dates so a date next to a number never shields the number
+    for date in DATE_PATTERN.finditer(text):
+        parts.append(PHONE_PATTERN.sub(_mask_phone, text[last:date.start()]))
+        parts.append(date.group(0))
+        last = date.end()
+    parts.append(PHONE_PATTERN.sub(_mask_phone, text[last:]))
+    return "".join(parts)
+
+
+def _scrub(obj, literals):
+    if isinstance(obj, str):
+        # Mask emails and phones first so a name inside them does not break the match
+        obj = _mask_phones(EMAIL_PATTERN.sub("<email>", obj))
+        for literal in literals:
+            obj = re.sub(r"\b" + re.escape(literal) + r"\b", "<redacted>", obj, flags=re.IGNORECASE)
+        return obj
+    if isinstance(obj, dict):
+        return {key: _scrub(value, literals) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [_scrub(value, literals) for value in obj]
+    return obj
+
+
+def sanitize_record(record):
+    """
+    Remove personal data from a capture record.
+
+    Only text that can carry user input is scrubbed: the request body, the LLM
+    responses and the text of the response. Values of sensitive request fields
+    (such as user_name) are replaced there so a replayed request produces the
+    same sanitized text, and emails and phone numbers are masked. Carousel and
+    other catalog payloads are left as they are.
+    """
+    literals = sorted(_collect_sensitive(record.get("request"), set()), key=len, reverse=True)
+    record = dict(record)
+    record["request"] = _scrub(record.get("request"), literals)
+    record["llm_responses"] = _scrub(record.get("llm_responses") or [], literals)
+    response = record.get("response")
+    if isinstance(response, dict):
+        response = dict(response)
+        for field in RESPONSE_TEXT_FIELDS:
+            if field in response:
+                response[field] = _scrub(response[field], literals)
+        record["response"] = response
+    return record
+
+
+def write_record(record, path=None):
+    """Append a sanitized record to the capture file."""
+    path = path or CAPTURE_PATH
+    line = json.dumps(sanitize_record(record), ensure_ascii=False, default=str)
+    directory = os.path.dirname(path)
+    with _write_lock:
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def load_records(path=None):
+    """Load the records of a capture file."""
+    records = []
+    with open(path or CAPTURE_PATH, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    return records
+
+
+def _response_json(result):
+    """Return the JSON body of a function or Flask view result."""
+    if isinstance(result, tuple):
+        status = result[1] if len(result) > 1 else 200
+        body = _response_json(result[0])["body"]
+        return {"body": body, "status": status}
+    if hasattr(result, "get_json"):
+        return {"body": result.get_json(silent=True), "status": getattr(result, "status_code", 200)}
+    return {"body": result, "status": None}
+
+
+def captured(endpoint, get_body=None):
+    """
+    Decorator that records each call of the wrapped function to the capture file.
+
+    A record holds the request body, the state before and after the call, every
+    LLM response received during the call, the output and the latency. When
+    CAPTURE_TRAFFIC is not set the function is returned unchanged.
+
+    Args:
+        endpoint: Name of the captured endpoint
+        get_body: Optional callable returning the request body, defaults to the
+            first positional argument
+    """
+    def decorator(func):
+        if not CAPTURE_TRAFFIC:
+            return func
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            # Already inside a captured turn, the outer record covers this call
+            if _current_record.get() is not None:
+                return func(*args, **kwargs)
+
+            body = get_body() if get_body else (args[0] if args else None)
+            record = {
+                "id": uuid.uuid4().hex,
+                "endpoint": endpoint,
+                "ts": time.time(),
+                "request": copy.deepcopy(body),
+                "state_before": copy.deepcopy(body.get("state")) if isinstance(body, dict) else None,
+                "llm_responses": []
+            }
+            token = _current_record.set(record)
+            try:
+                start = time.perf_counter()
+                result = func(*args, **kwargs)
+                record["latency_ms"] = (time.perf_counter() - start) * 1000
+            finally:
+                _current_record.reset(token)
+
+            try:
+                output = _response_json(result)
+                record["response"] = output["body"]
+                record["status"] = output["status"]
+                if isinstance(output["body"], dict):
+                    record["state_after"] = output["body"].get("state")
+                write_record(record)
+            except Exception as e:
+                print(f"Error capturing {endpoint} traffic: {e}")
+            return result
+        return wrapper
+    return decorator
+
+
+def recorded_llm(func):
+    """
+    Decorator for the LLM call.
+
+    While capturing, the returned text is added to the current record. While
+    replaying, responses are served from the recording instead of calling func.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        responses = _replay_responses.get()
+        if responses is not None:
+            return responses.pop(0) if responses else None
+
+        response = func(*args, **kwargs)
+        record = _current_record.get()
+        if record is not None:
+            record["llm_responses"].append(response)
+        return response
+    return wrapper
+
+
+def replay_call(record, func, *args, **kwargs):
+    """Call func with the LLM responses of record served from the recording."""
+    token = _replay_responses.set(list(record.get("llm_responses") or []))
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _replay_responses.reset(token)
+
+
+def collect_llm_responses(func, *args, **kwargs):
+    """
+    Call func outside any capture record.
+
+    Returns:
+        Tuple of (func result, LLM responses received during the call,
+        whether the turn was marked failed)
+    """
+    scratch = {"llm_responses": []}
+    token = _current_record.set(scratch)
+    try:
+        return func(*args, **kwargs), scratch["llm_responses"], scratch.get("failed", False)
+    finally:
+        _current_record.reset(token)
+
+
+def mark_turn_failed():
+    """Flag the current turn as failed, e.g. when the LLM call errored and a fallback was used."""
+    record = _current_record.get()
+    if record is not None:
+        record["failed"] = True
+
+
+def add_llm_responses(responses):
+    """Add LLM responses received elsewhere (e.g. prefetched) to the current record."""
+    record = _current_record.get()
+    if record is not None:
+        record["llm_responses"].extend(responses)